@@ -3,63 +3,134 @@ Audio engine module
 Handles real-time audio playback and synthesis
 """
 
+import logging
 import pygame
 import numpy as np
 import threading
 import time
-import math
-from typing import Dict, List, Optional
-from queue import Queue, Empty
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from queue import SimpleQueue
+from config import Config
+from jit_support import NUMBA_AVAILABLE, njit, prange, warm_up
+
+logger = logging.getLogger(__name__)
+
+# Additive synthesis mix: fundamental, octave, fifth and fourth
+HARMONIC_MULTIPLES = np.array([1, 2, 3, 4], dtype=np.float32)
+HARMONIC_AMPLITUDES = np.array([1.0, 0.3, 0.2, 0.1], dtype=np.float32)
+
+# Single-cycle wavetable length; a power of two so wrapping is a bitmask
+WAVETABLE_SIZE = 2048
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _synth_note_kernel(samples, wavetable, frequency, volume, sample_rate, duration,
+                           attack_time, decay_time, sustain_level, release_time):
+        """Fused wavetable lookup + ADSR + volume + int16 conversion for one note, into samples"""
+        sample_count = samples.shape[0]
+        table_mask = wavetable.shape[0] - 1
+        table_step = frequency * wavetable.shape[0] / sample_rate
+        release_start = duration - release_time
+        
+        for i in prange(sample_count):
+            t = i / sample_rate
+            wave = wavetable[np.int64(i * table_step) & table_mask]
+            
+            if t < attack_time:
+                envelope = t / attack_time
+            elif t < attack_time + decay_time:
+                envelope = 1.0 - (1.0 - sustain_level) * ((t - attack_time) / decay_time)
+            elif t < release_start:
+                envelope = sustain_level
+            else:
+                envelope = sustain_level * (1.0 - (t - release_start) / release_time)
+            
+            value = np.int16(min(max(np.rint(wave * envelope * volume * 32767.0), -32768.0), 32767.0))
+            for channel in range(samples.shape[1]):
+                samples[i, channel] = value
 
 class AudioEngine:
+    """
+    Synthesizes and plays notes through the pygame mixer
+    
+    Sample buffers are built as C-contiguous int16 arrays of shape
+    (samples, channels) at the sample rate and channel count the mixer was
+    actually opened with, so make_sound can copy them without conversion.
+    """
+    
     def __init__(self):
         # Initialize pygame mixer
-        pygame.mixer.pre_init(frequency=44100, size=-16, channels=2, buffer=512)
+        pygame.mixer.pre_init(frequency=Config.SAMPLE_RATE, size=-16,
+                              channels=Config.AUDIO_CHANNELS, buffer=Config.AUDIO_BUFFER_SIZE)
         pygame.mixer.init()
         
-        # Audio parameters
-        self.sample_rate = 44100
-        self.channels = 2
-        self.bit_depth = 16
+        # Audio parameters, taken from the opened mixer (SDL may pick a
+        # different rate or channel count, but keeps the signed 16-bit format)
+        self.sample_rate, mixer_format, self.channels = pygame.mixer.get_init()
+        self.bit_depth = abs(mixer_format)
+        if mixer_format != -16:
+            raise RuntimeError(f"Unsupported mixer sample format: {mixer_format}")
         
         # Sound generation parameters
         self.volume = 0.5
         self.note_duration = 0.5  # Default note duration in seconds
         
+        # ADSR envelope parameters
+        self.attack_time = 0.1
+        self.decay_time = 0.2
+        self.sustain_level = 0.7
+        self.release_time = 0.3
+        
+        # Output buffer for synthesized notes
+        self._int_buf = np.empty((int(self.sample_rate * self.note_duration), self.channels),
+                                 dtype=np.int16)
+        
+        # One period of the harmonic mix, resampled at the note frequency during synthesis
+        cycle = np.linspace(0, 2 * np.pi, WAVETABLE_SIZE, endpoint=False, dtype=np.float32)
+        self._wavetable = HARMONIC_AMPLITUDES @ np.sin(HARMONIC_MULTIPLES[:, None] * cycle[None, :])
+        
+        # Peak of the waveform, used to normalize notes to full scale
+        self.wave_peak = float(np.abs(self._wavetable).max())
+        
         # Audio queue for real-time playback
-        self.audio_queue = Queue()
+        self.audio_queue = SimpleQueue()
         self.playing = False
         self.audio_thread = None
+        self._stop_evt = threading.Event()
         
-        # Currently playing sounds
-        self.active_sounds = {}
+        # Currently playing sounds, oldest first
+        self.active_sounds = OrderedDict()
+        self.max_voices = Config.MAX_CONCURRENT_NOTES
         self.sound_lock = threading.Lock()
         
+        # Synthesized sounds keyed by (note, velocity bucket)
+        self._sound_cache: Dict[Tuple[int, int], pygame.mixer.Sound] = {}
+        
         # Note frequencies (A4 = 440 Hz)
         self.note_frequencies = self._generate_note_frequencies()
+        self._freq_arr = np.array([self.note_frequencies[i] for i in range(128)], dtype=np.float32)
+        
+        warm_up(lambda: self._synthesize_samples(440.0, 0.0))
         
         print("Audio engine initialized")
     
     def _generate_note_frequencies(self) -> Dict[int, float]:
         """Generate frequency mapping for MIDI notes"""
-        frequencies = {}
-        
         # A4 (MIDI note 69) = 440 Hz
         a4_frequency = 440.0
         a4_midi = 69
         
-        for midi_note in range(128):
-            # Calculate frequency using equal temperament
-            semitone_ratio = 2 ** (1/12)
-            frequency = a4_frequency * (semitone_ratio ** (midi_note - a4_midi))
-            frequencies[midi_note] = frequency
+        # Calculate all frequencies at once using equal temperament
+        frequencies = a4_frequency * np.exp2((np.arange(128) - a4_midi) / 12.0)
         
-        return frequencies
+        return dict(enumerate(frequencies.tolist()))
     
     def start(self):
         """Start the audio engine"""
         if not self.playing:
             self.playing = True
+            self._stop_evt.clear()
             self.audio_thread = threading.Thread(target=self._audio_loop, daemon=True)
             self.audio_thread.start()
             print("Audio engine started")
@@ -67,7 +138,10 @@ class AudioEngine:
     def stop(self):
         """Stop the audio engine"""
         self.playing = False
+        self._stop_evt.set()
         if self.audio_thread:
+            # Wake the audio thread blocked on the queue
+            self.audio_queue.put(None)
             self.audio_thread.join(timeout=1.0)
         
         # Stop all active sounds
@@ -81,13 +155,13 @@ class AudioEngine:
     
     def _audio_loop(self):
         """Main audio processing loop"""
-        while self.playing:
+        while not self._stop_evt.is_set():
             try:
-                # Process audio events from queue
-                event = self.audio_queue.get(timeout=0.1)
+                # Block until the next audio event or the shutdown sentinel
+                event = self.audio_queue.get()
+                if event is None:
+                    continue
                 self._process_audio_event(event)
-            except Empty:
-                continue
             except Exception as e:
                 print(f"Audio loop error: {e}")
     
@@ -114,27 +188,44 @@ class AudioEngine:
         note_number = event.get('note')
         velocity = event.get('velocity', 64)
         
-        if note_number is None or note_number not in self.note_frequencies:
+        # Integral floats are valid note numbers, as with the old frequency dict
+        if note_number is None or not (0 <= note_number < 128) or note_number % 1:
             return
+        note_number = int(note_number)
         
-        frequency = self.note_frequencies[note_number]
+        frequency = self._freq_arr[note_number]
         
-        # Calculate volume from velocity
-        volume = (velocity / 127.0) * self.volume
+        # Quantize velocity (int or float) into 8 levels so notes share cached sounds
+        velocity = min(max(velocity, 0), 127)
+        velocity_bucket = int(velocity) >> 4
         
-        # Generate and play sound
-        sound = self._generate_note_sound(frequency, volume)
+        # Reuse the cached sound for this note, generating it on first use
+        cache_key = (note_number, velocity_bucket)
+        sound = self._sound_cache.get(cache_key)
+        if sound is None:
+            # Calculate volume from the center velocity of the bucket; the master
+            # volume is applied by the mixer so cached sounds stay valid
+            volume = (velocity_bucket * 16 + 8) / 127.0
+            
+            sound = self._generate_note_sound(frequency, volume)
+            self._sound_cache[cache_key] = sound
         
         with self.sound_lock:
             # Stop previous instance of this note if playing
             if note_number in self.active_sounds:
-                self.active_sounds[note_number].stop()
+                self.active_sounds.pop(note_number).stop()
+            
+            # Steal the oldest voice when all voices are in use
+            while len(self.active_sounds) >= self.max_voices:
+                _, oldest_sound = self.active_sounds.popitem(last=False)
+                oldest_sound.stop()
             
             # Play new sound
             self.active_sounds[note_number] = sound
+            sound.set_volume(self.volume)
             sound.play()
         
-        print(f"Playing note {note_number} ({frequency:.2f} Hz) at velocity {velocity}")
+        logger.debug("Playing note %s (%.2f Hz) at velocity %s", note_number, frequency, velocity)
     
     def _stop_note(self, event: Dict):
         """Stop playing a specific note"""
@@ -148,66 +239,82 @@ class AudioEngine:
                 self.active_sounds[note_number].stop()
                 del self.active_sounds[note_number]
         
-        print(f"Stopped note {note_number}")
+        logger.debug("Stopped note %s", note_number)
     
     def _generate_note_sound(self, frequency: float, volume: float) -> pygame.mixer.Sound:
         """Generate a sound wave for a given frequency"""
+        samples_int = self._synthesize_samples(frequency, volume)
+        assert samples_int.dtype == np.int16 and samples_int.flags.c_contiguous
+        
+        # Create pygame sound (mono mixers take a 1-D array)
+        if self.channels == 1:
+            samples_int = samples_int[:, 0]
+        sound = pygame.sndarray.make_sound(samples_int)
+        
+        return sound
+    
+    def _synthesize_samples(self, frequency: float, volume: float) -> np.ndarray:
+        """Synthesize the (samples, channels) int16 sample buffer for a note"""
         duration = self.note_duration
         sample_count = int(self.sample_rate * duration)
         
-        # Generate sine wave with envelope
-        samples = np.zeros((sample_count, self.channels), dtype=np.float32)
+        # Scale so that full volume reaches the int16 peak without clipping
+        volume = volume / self.wave_peak
         
-        for i in range(sample_count):
-            t = i / self.sample_rate
-            
-            # Basic sine wave
-            wave_value = math.sin(2 * math.pi * frequency * t)
-            
-            # Add some harmonics for richer sound
-            wave_value += 0.3 * math.sin(2 * math.pi * frequency * 2 * t)  # Octave
-            wave_value += 0.2 * math.sin(2 * math.pi * frequency * 3 * t)  # Fifth
-            wave_value += 0.1 * math.sin(2 * math.pi * frequency * 4 * t)  # Fourth
-            
-            # Apply envelope (ADSR - Attack, Decay, Sustain, Release)
-            envelope = self._calculate_envelope(t, duration)
-            
-            # Apply volume and envelope
-            final_value = wave_value * volume * envelope
-            
-            # Stereo output
-            samples[i][0] = final_value  # Left channel
-            samples[i][1] = final_value  # Right channel
+        # Reuse one output buffer across notes; make_sound copies it into the Sound
+        if self._int_buf.shape[0] != sample_count:
+            self._int_buf = np.empty((sample_count, self.channels), dtype=np.int16)
+        samples_int = self._int_buf
         
-        # Convert to 16-bit integers
-        samples_int = (samples * 32767).astype(np.int16)
+        if NUMBA_AVAILABLE:
+            _synth_note_kernel(samples_int, self._wavetable, float(frequency), float(volume),
+                               float(self.sample_rate), float(duration),
+                               self.attack_time, self.decay_time,
+                               self.sustain_level, self.release_time)
+            return samples_int
         
-        # Create pygame sound
-        sound = pygame.sndarray.make_sound(samples_int)
+        # Time axis for every sample of the note
+        sample_index = np.arange(sample_count)
+        t = sample_index.astype(np.float32)
+        t /= self.sample_rate
         
-        return sound
+        # Read the waveform from the wavetable with a phase accumulator
+        table_step = frequency * WAVETABLE_SIZE / self.sample_rate
+        table_index = (sample_index * table_step).astype(np.int64) & (WAVETABLE_SIZE - 1)
+        mono = self._wavetable[table_index]
+        
+        # Apply envelope (ADSR - Attack, Decay, Sustain, Release) and volume
+        mono *= self._calculate_envelope_vec(t, duration)
+        mono *= volume * 32767
+        
+        # Round and saturate, then convert to 16-bit integers straight into every channel
+        np.rint(mono, out=mono)
+        np.clip(mono, -32768, 32767, out=mono)
+        samples_int[:] = mono[:, None]
+        
+        return samples_int
     
-    def _calculate_envelope(self, t: float, duration: float) -> float:
-        """Calculate ADSR envelope value at time t"""
-        attack_time = 0.1
-        decay_time = 0.2
-        sustain_level = 0.7
-        release_time = 0.3
-        
-        if t < attack_time:
-            # Attack phase
-            return t / attack_time
-        elif t < attack_time + decay_time:
-            # Decay phase
-            decay_progress = (t - attack_time) / decay_time
-            return 1.0 - (1.0 - sustain_level) * decay_progress
-        elif t < duration - release_time:
-            # Sustain phase
-            return sustain_level
-        else:
-            # Release phase
-            release_progress = (t - (duration - release_time)) / release_time
-            return sustain_level * (1.0 - release_progress)
+    def _calculate_envelope_vec(self, t: np.ndarray, duration: float) -> np.ndarray:
+        """Calculate ADSR envelope values for an array of sample times"""
+        attack_time = self.attack_time
+        decay_time = self.decay_time
+        sustain_level = self.sustain_level
+        release_time = self.release_time
+        release_start = duration - release_time
+        
+        # Phase masks (Attack, Decay, Sustain, Release)
+        m_att = t < attack_time
+        m_dec = ~m_att & (t < attack_time + decay_time)
+        m_rel = ~m_att & ~m_dec & (t >= release_start)
+        m_sus = ~(m_att | m_dec | m_rel)
+        
+        envelope = np.empty_like(t)
+        envelope[m_att] = t[m_att] / attack_time
+        envelope[m_dec] = 1.0 - (1.0 - sustain_level) * ((t[m_dec] - attack_time) / decay_time)
+        envelope[m_sus] = sustain_level
+        envelope[m_rel] = sustain_level * (1.0 - (t[m_rel] - release_start) / release_time)
+        
+        return envelope
     
     def _handle_control_change(self, event: Dict):
         """Handle MIDI control change events"""
@@ -215,14 +322,14 @@ class AudioEngine:
         value = event.get('value', 0)
         
         if control == 7:  # Main volume
-            self.volume = value / 127.0
-            print(f"Volume changed to {self.volume:.2f}")
+            self._set_master_volume(value / 127.0)
+            logger.debug("Volume changed to %.2f", self.volume)
         elif control == 64:  # Sustain pedal
             sustain_on = value >= 64
             if sustain_on:
-                print("Sustain pedal ON")
+                logger.debug("Sustain pedal ON")
             else:
-                print("Sustain pedal OFF")
+                logger.debug("Sustain pedal OFF")
                 # Could implement sustain logic here
     
     def _handle_pitch_bend(self, event: Dict):
@@ -232,12 +339,19 @@ class AudioEngine:
         # Convert MIDI pitch bend to semitones (-2 to +2)
         semitones = ((pitch_value - 8192) / 8192.0) * 2.0
         
-        print(f"Pitch bend: {semitones:.2f} semitones")
+        logger.debug("Pitch bend: %.2f semitones", semitones)
         # Could implement pitch bend effect here
     
     def set_volume(self, volume: float):
         """Set master volume (0.0 to 1.0)"""
-        self.volume = max(0.0, min(1.0, volume))
+        self._set_master_volume(max(0.0, min(1.0, volume)))
+    
+    def _set_master_volume(self, volume: float):
+        """Update master volume, applying it live to the playing sounds"""
+        self.volume = volume
+        with self.sound_lock:
+            for sound in self.active_sounds.values():
+                sound.set_volume(volume)
     
     def get_volume(self) -> float:
         """Get current master volume"""
@@ -249,7 +363,7 @@ class AudioEngine:
             for sound in self.active_sounds.values():
                 sound.stop()
             self.active_sounds.clear()
-        print("All notes stopped")
+        logger.debug("All notes stopped")
     
     def get_active_note_count(self) -> int:
         """Get number of currently playing notes"""
@@ -12,9 +12,11 @@ class Config:
     CAMERA_WIDTH = 640
     CAMERA_HEIGHT = 480
     CAMERA_FPS = 30
+    CAMERA_FOURCC = "MJPG"  # Compressed capture format, less USB bandwidth than YUYV
     
     # Hand tracking settings
-    MAX_HANDS = 2
+    MAX_HANDS = 1
+    MODEL_COMPLEXITY = 0  # 0 = lite model, 1 = full model
     MIN_DETECTION_CONFIDENCE = 0.7
     MIN_TRACKING_CONFIDENCE = 0.5
     
@@ -44,6 +46,7 @@ class Config:
     # Performance settings
     MAX_CONCURRENT_NOTES = 10
     FRAME_BUFFER_SIZE = 5
+    MAX_TRACKING_ERRORS = 30  # consecutive failed frames before tracking gives up
     
     # File paths
     TEMP_DIR = os.path.join(os.path.expanduser("~"), ".motion_music_temp")
@@ -3,9 +3,77 @@ Gesture recognition module
 Analyzes hand landmarks to recognize musical gestures and movements
 """
 
+import math
 import numpy as np
 import time
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple
+from jit_support import NUMBA_AVAILABLE, njit, warm_up
+
+# Finger order used for finger-state bitmasks
+FINGER_NAMES = ('thumb', 'index', 'middle', 'ring', 'pinky')
+THUMB_BIT = 1 << 0
+INDEX_BIT = 1 << 1
+MIDDLE_BIT = 1 << 2
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _hand_kernel(center_xy, prev_center_xy, dt, hand_size, tips_xy, finger_mask,
+                     zone_lut, zone_width, zone_height, grid_x_max, grid_y_max,
+                     frame_width, frame_height, velocity_threshold):
+        """
+        Zone lookup, note velocity and movement controls for one hand
+        
+        Returns an (n, 5) int64 array of [finger, row, col, note_number, velocity]
+        rows and a float64 array of [pitch_bend, modulation, position_x, position_y,
+        volume] where NaN marks a control that is not present
+        """
+        has_motion = dt > 0.0
+        dx = center_xy[0] - prev_center_xy[0]
+        dy = center_xy[1] - prev_center_xy[1]
+        speed = math.hypot(dx, dy) / dt if has_motion else 0.0
+        
+        # Note velocity from hand size and movement speed
+        size_factor = min(hand_size / 100.0, 2.0)
+        speed_factor = min(speed / 100.0, 2.0) if has_motion else 1.0
+        velocity = max(1, min(127, int(64 * size_factor * speed_factor)))
+        
+        notes = np.empty((tips_xy.shape[0], 5), dtype=np.int64)
+        count = 0
+        for finger in range(tips_xy.shape[0]):
+            if not (finger_mask >> finger) & 1:
+                continue
+            x = tips_xy[finger, 0] / frame_width
+            y = tips_xy[finger, 1] / frame_height
+            if not (0.0 <= x <= grid_x_max and 0.0 <= y <= grid_y_max):
+                continue
+            row = min(zone_lut.shape[0] - 1, int(y / zone_height))
+            col = min(zone_lut.shape[1] - 1, int(x / zone_width))
+            notes[count, 0] = finger
+            notes[count, 1] = row
+            notes[count, 2] = col
+            notes[count, 3] = zone_lut[row, col]
+            notes[count, 4] = velocity
+            count += 1
+        
+        controls = np.full(5, np.nan)
+        if has_motion:
+            if speed > velocity_threshold:
+                if abs(dx) > abs(dy):
+                    direction = 1.0 if dx > 0 else -1.0
+                    controls[0] = direction * min(speed / 100.0, 1.0)
+                else:
+                    direction = 1.0 if dy < 0 else -1.0  # Up is positive
+                    controls[1] = direction * min(speed / 100.0, 1.0)
+            
+            norm_y = center_xy[1] / frame_height
+            controls[2] = center_xy[0] / frame_width
+            controls[3] = norm_y
+            controls[4] = max(0.1, 1.0 - norm_y)
+        
+        return notes[:count], controls
+
+# Control names in the order returned by the hand kernel
+CONTROL_NAMES = ('pitch_bend', 'modulation', 'position_x', 'position_y', 'volume')
 
 class GestureRecognizer:
     def __init__(self):
@@ -21,11 +89,20 @@ class GestureRecognizer:
         # Musical mapping zones (normalized coordinates)
         self.note_zones = self._create_note_zones()
         
+        warm_up(lambda: self._analyze_hand_compiled({'center': (0.0, 0.0)}, 'Unknown',
+                                                    time.time()))
+        
     def _create_note_zones(self) -> Dict:
         """Create zones on screen that map to different musical notes"""
         # Divide screen into a musical grid
         zones = {}
         
+        # Grid geometry, also used for direct (row, col) lookup of a position
+        self._zone_cols = 5
+        self._zone_rows = 7
+        self._zone_width = 0.2
+        self._zone_height = 0.14
+        
         # Create a 7x5 grid for notes (7 octaves, 5 zones per octave)
         for octave in range(7):
             for zone in range(5):
@@ -43,6 +120,21 @@ class GestureRecognizer:
                     'note_number': note_index + 60  # Middle C starts at 60
                 }
         
+        # Parallel arrays of the zone fields, in row-major grid order
+        zone_list = list(zones.values())
+        self._zone_x0 = np.array([zone['x_range'][0] for zone in zone_list])
+        self._zone_x1 = np.array([zone['x_range'][1] for zone in zone_list])
+        self._zone_y0 = np.array([zone['y_range'][0] for zone in zone_list])
+        self._zone_y1 = np.array([zone['y_range'][1] for zone in zone_list])
+        self._zone_notes = np.array([zone['note_number'] for zone in zone_list], dtype=np.int16)
+        self._zone_note_names = np.array(list(zones.keys()), dtype=object)
+        
+        # Grid extent and (row, col) views used for position lookup
+        self._grid_x_max = float(self._zone_x1.max())
+        self._grid_y_max = float(self._zone_y1.max())
+        self._zone_lut = self._zone_notes.reshape(self._zone_rows, self._zone_cols)
+        self._zone_names = self._zone_note_names.reshape(self._zone_rows, self._zone_cols)
+        
         return zones
     
     def _get_note_name(self, note_index: int) -> str:
@@ -73,12 +165,18 @@ class GestureRecognizer:
             'movements': {}
         }
         
-        # Analyze finger positions for note triggering
-        finger_notes = self._analyze_finger_positions(hand_data)
-        gestures['notes'].extend(finger_notes)
+        if NUMBA_AVAILABLE:
+            # Notes and controls from a single compiled pass
+            finger_notes, movement_controls = self._analyze_hand_compiled(
+                hand_data, handedness, current_time)
+        else:
+            # Analyze finger positions for note triggering
+            finger_notes = self._analyze_finger_positions(hand_data)
+            
+            # Analyze hand movements for controls
+            movement_controls = self._analyze_hand_movement(hand_data, handedness)
         
-        # Analyze hand movements for controls
-        movement_controls = self._analyze_hand_movement(hand_data, handedness)
+        gestures['notes'].extend(finger_notes)
         gestures['controls'].update(movement_controls)
         
         # Analyze gesture patterns
@@ -94,6 +192,54 @@ class GestureRecognizer:
         
         return gestures
     
+    def _analyze_hand_compiled(self, hand_data: Dict, handedness: str,
+                               current_time: float) -> Tuple[List[Dict], Dict]:
+        """Pack hand data into arrays and analyze it with the compiled hand kernel"""
+        frame_width, frame_height = 640, 480  # Assume standard size
+        finger_positions = hand_data.get('finger_positions', {})
+        gesture_features = hand_data.get('gesture_features', {})
+        
+        center_xy = np.array(hand_data['center'], dtype=np.float64)
+        prev_data = self.previous_positions.get(handedness)
+        if prev_data is not None:
+            prev_center_xy = np.array(prev_data['center'], dtype=np.float64)
+            dt = current_time - prev_data['timestamp']
+        else:
+            prev_center_xy = center_xy
+            dt = 0.0
+        
+        tips = finger_positions.get('tips')
+        if tips:
+            tips_xy = np.array([tips[name] for name in FINGER_NAMES], dtype=np.float64)
+            finger_mask = self._finger_mask(gesture_features)
+        else:
+            tips_xy = np.zeros((len(FINGER_NAMES), 2), dtype=np.float64)
+            finger_mask = 0
+        
+        note_rows, control_values = _hand_kernel(
+            center_xy, prev_center_xy, float(dt),
+            float(gesture_features.get('hand_size', 100)), tips_xy, finger_mask,
+            self._zone_lut, self._zone_width, self._zone_height,
+            self._grid_x_max, self._grid_y_max,
+            float(frame_width), float(frame_height), self.velocity_threshold)
+        
+        notes = []
+        for finger, row, col, note_number, velocity in note_rows.tolist():
+            notes.append({
+                'note_number': note_number,
+                'note_name': self._zone_names[row, col],
+                'velocity': velocity,
+                'finger': FINGER_NAMES[finger],
+                'position': (float(tips_xy[finger, 0]) / frame_width,
+                             float(tips_xy[finger, 1]) / frame_height)
+            })
+        
+        controls = {name: value
+                    for name, value in zip(CONTROL_NAMES, control_values.tolist())
+                    if not math.isnan(value)}
+        
+        return notes, controls
+    
     def _analyze_finger_positions(self, hand_data: Dict) -> List[Dict]:
         """Analyze finger positions to trigger notes"""
         notes = []
@@ -106,42 +252,38 @@ class GestureRecognizer:
         frame_width = 640  # Assume standard width
         frame_height = 480  # Assume standard height
         
-        for finger_name, tip_position in finger_positions['tips'].items():
-            if finger_states.get(finger_name, False):  # Finger is extended
-                # Normalize position
-                norm_x = tip_position[0] / frame_width
-                norm_y = tip_position[1] / frame_height
-                
-                # Find corresponding note zone
-                note_info = self._position_to_note(norm_x, norm_y)
-                if note_info:
-                    # Calculate velocity based on hand size and movement
-                    velocity = self._calculate_note_velocity(hand_data, finger_name)
-                    
-                    notes.append({
-                        'note_number': note_info['note_number'],
-                        'note_name': note_info['note_name'],
-                        'velocity': velocity,
-                        'finger': finger_name,
-                        'position': (norm_x, norm_y)
-                    })
+        # Only extended fingers can trigger notes
+        finger_names = [name for name in finger_positions['tips']
+                        if finger_states.get(name, False)]
+        if not finger_names:
+            return notes
         
-        return notes
-    
-    def _position_to_note(self, x: float, y: float) -> Optional[Dict]:
-        """Convert screen position to musical note"""
-        for note_name, zone in self.note_zones.items():
-            x_range = zone['x_range']
-            y_range = zone['y_range']
+        # Normalize all tip positions at once
+        tips = np.array([finger_positions['tips'][name] for name in finger_names], dtype=np.float64)
+        norm = tips / np.array([frame_width, frame_height], dtype=np.float64)
+        
+        # Find corresponding note zones for every tip
+        in_grid = ((norm[:, 0] >= 0.0) & (norm[:, 0] <= self._grid_x_max) &
+                   (norm[:, 1] >= 0.0) & (norm[:, 1] <= self._grid_y_max))
+        cols = np.minimum((norm[:, 0] / self._zone_width).astype(np.int64), self._zone_cols - 1)
+        rows = np.minimum((norm[:, 1] / self._zone_height).astype(np.int64), self._zone_rows - 1)
+        
+        for i in np.flatnonzero(in_grid):
+            finger_name = finger_names[i]
+            row, col = rows[i], cols[i]
             
-            if (x_range[0] <= x <= x_range[1] and 
-                y_range[0] <= y <= y_range[1]):
-                return {
-                    'note_name': note_name,
-                    'note_number': zone['note_number']
-                }
+            # Calculate velocity based on hand size and movement
+            velocity = self._calculate_note_velocity(hand_data, finger_name)
+            
+            notes.append({
+                'note_number': int(self._zone_lut[row, col]),
+                'note_name': self._zone_names[row, col],
+                'velocity': velocity,
+                'finger': finger_name,
+                'position': (float(norm[i, 0]), float(norm[i, 1]))
+            })
         
-        return None
+        return notes
     
     def _calculate_note_velocity(self, hand_data: Dict, finger_name: str) -> int:
         """Calculate MIDI velocity based on hand dynamics"""
@@ -160,8 +302,8 @@ class GestureRecognizer:
             time_diff = time.time() - prev_data['timestamp']
             
             if time_diff > 0:
-                speed = np.sqrt((current_center[0] - prev_center[0])**2 + 
-                              (current_center[1] - prev_center[1])**2) / time_diff
+                speed = math.hypot(current_center[0] - prev_center[0],
+                                   current_center[1] - prev_center[1]) / time_diff
                 speed_factor = min(speed / 100.0, 2.0)  # Normalize and cap
             else:
                 speed_factor = 1.0
@@ -188,7 +330,7 @@ class GestureRecognizer:
                 # Calculate velocity
                 dx = current_center[0] - prev_center[0]
                 dy = current_center[1] - prev_center[1]
-                velocity = np.sqrt(dx**2 + dy**2) / time_diff
+                velocity = math.hypot(dx, dy) / time_diff
                 
                 # Map movement to controls
                 if velocity > self.velocity_threshold:
@@ -219,23 +361,23 @@ class GestureRecognizer:
         """Recognize complex gesture patterns"""
         patterns = {}
         
-        finger_states = hand_data.get('gesture_features', {}).get('finger_states', {})
+        finger_mask = self._finger_mask(hand_data.get('gesture_features', {}))
         
         # Count extended fingers
-        extended_count = sum(1 for extended in finger_states.values() if extended)
+        extended_count = bin(finger_mask).count('1')
         patterns['extended_fingers'] = extended_count
         
         # Recognize specific gestures
-        if self._is_fist(finger_states):
+        if self._is_fist(finger_mask):
             patterns['gesture_type'] = 'fist'
             patterns['action'] = 'stop_all_notes'
-        elif self._is_open_hand(finger_states):
+        elif self._is_open_hand(extended_count):
             patterns['gesture_type'] = 'open_hand'
             patterns['action'] = 'sustain_notes'
-        elif self._is_pointing(finger_states):
+        elif self._is_pointing(finger_mask):
             patterns['gesture_type'] = 'pointing'
             patterns['action'] = 'single_note'
-        elif self._is_peace_sign(finger_states):
+        elif self._is_peace_sign(finger_mask):
             patterns['gesture_type'] = 'peace'
             patterns['action'] = 'chord_mode'
         else:
@@ -244,24 +386,31 @@ class GestureRecognizer:
         
         return patterns
     
-    def _is_fist(self, finger_states: Dict) -> bool:
+    def _finger_mask(self, gesture_features: Dict) -> int:
+        """Get the finger-state bitmask (bit 0 = thumb ... bit 4 = pinky)"""
+        # The hand tracker already provides the packed mask
+        if 'finger_mask' in gesture_features:
+            return gesture_features['finger_mask']
+        
+        finger_states = gesture_features.get('finger_states', {})
+        mask = 0
+        for bit, finger_name in enumerate(FINGER_NAMES):
+            if finger_states.get(finger_name, False):
+                mask |= 1 << bit
+        return mask
+    
+    def _is_fist(self, finger_mask: int) -> bool:
         """Check if hand is making a fist"""
-        return sum(finger_states.values()) == 0
+        return finger_mask == 0
     
-    def _is_open_hand(self, finger_states: Dict) -> bool:
+    def _is_open_hand(self, extended_count: int) -> bool:
         """Check if hand is open"""
-        return sum(finger_states.values()) >= 4
+        return extended_count >= 4
     
-    def _is_pointing(self, finger_states: Dict) -> bool:
-        """Check if hand is pointing (index finger extended)"""
-        return (finger_states.get('index', False) and 
-                not finger_states.get('middle', False) and
-                not finger_states.get('ring', False) and
-                not finger_states.get('pinky', False))
+    def _is_pointing(self, finger_mask: int) -> bool:
+        """Check if hand is pointing (index finger extended, thumb ignored)"""
+        return (finger_mask & ~THUMB_BIT) == INDEX_BIT
     
-    def _is_peace_sign(self, finger_states: Dict) -> bool:
-        """Check if hand is making peace sign (index and middle extended)"""
-        return (finger_states.get('index', False) and 
-                finger_states.get('middle', False) and
-                not finger_states.get('ring', False) and
-                not finger_states.get('pinky', False))
+    def _is_peace_sign(self, finger_mask: int) -> bool:
+        """Check if hand is making peace sign (index and middle extended, thumb ignored)"""
+        return (finger_mask & ~THUMB_BIT) == (INDEX_BIT | MIDDLE_BIT)
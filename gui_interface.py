@@ -6,9 +6,16 @@ Provides the main user interface for the motion music application
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import cv2
-from PIL import Image, ImageTk
+import numpy as np
 import threading
 import time
+import collections
+from config import Config
+from hand_tracker import CONNECTION_CHAINS
+
+# Radius of the landmark dots drawn over the video, in preview pixels
+LANDMARK_RADIUS = 3
+CENTER_RADIUS = 8
 
 class MusicCreatorGUI:
     def __init__(self, app):
@@ -18,14 +25,24 @@ class MusicCreatorGUI:
         self.root.geometry("1000x700")
         
         # Video display variables
-        self.video_label = None
+        self.video_canvas = None
         self.current_frame = None
+        self._video_image = None  # Persistent Tk photo image updated in place
+        self._hand_overlays = []  # Canvas item handles, one dict per tracked hand
+        
+        # Preview size and conversion buffers, sized for the configured camera
+        self._preview_height = 400
+        self._allocate_preview_buffers(Config.CAMERA_WIDTH, Config.CAMERA_HEIGHT)
         
         # Control variables
         self.is_tracking = False
         self.volume_var = tk.DoubleVar(value=0.5)
         self.status_var = tk.StringVar(value="Ready")
         
+        # Entries shown in the metrics panel, oldest dropped first
+        self._log = collections.deque(maxlen=100)
+        self._log_flush_pending = False
+        
         # Initialize GUI components
         self._create_gui()
         
@@ -102,13 +119,40 @@ class MusicCreatorGUI:
         video_frame.columnconfigure(0, weight=1)
         video_frame.rowconfigure(0, weight=1)
         
-        # Video display label
-        self.video_label = ttk.Label(video_frame, text="Camera feed will appear here")
-        self.video_label.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        # Video display canvas: the frame is an image item, and the hand
+        # overlay is made of canvas items moved on top of it
+        self.video_canvas = tk.Canvas(video_frame, width=self._preview_width,
+                                      height=self._preview_height, highlightthickness=0)
+        self.video_canvas.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        self._placeholder_item = self.video_canvas.create_text(
+            self._preview_width // 2, self._preview_height // 2,
+            text="Camera feed will appear here")
+        self._img_item = self.video_canvas.create_image(0, 0, anchor=tk.NW)
+        
+        for hand_index in range(Config.MAX_HANDS):
+            self._hand_overlays.append(self._create_hand_overlay(f"hand{hand_index}"))
         
         # Configure minimum size
         video_frame.configure(width=640, height=480)
         
+    def _create_hand_overlay(self, tag):
+        """Create the hidden canvas items drawn over one hand"""
+        canvas = self.video_canvas
+        options = {'state': tk.HIDDEN, 'tags': (tag,)}
+        
+        return {
+            'tag': tag,
+            'landmarks': [canvas.create_oval(0, 0, 0, 0, fill="#00ff00", outline="", **options)
+                          for _ in range(21)],
+            'connections': [canvas.create_line(0, 0, 0, 0, fill="#ffff00", width=2, **options)
+                            for _ in CONNECTION_CHAINS],
+            'center': canvas.create_oval(0, 0, 0, 0, fill="#0000ff", outline="", **options),
+            'bbox': canvas.create_rectangle(0, 0, 0, 0, outline="#00ffff", width=2, **options),
+            'label': canvas.create_text(0, 0, anchor=tk.SW, fill="#ffffff",
+                                        font=("Arial", 12, "bold"), **options)
+        }
+        
     def _create_status_panel(self, parent):
         """Create status and information panel"""
         status_frame = ttk.LabelFrame(parent, text="Status", padding="10")
@@ -175,7 +219,11 @@ Instructions:
         self._log_message("Hand tracking stopped")
         
         # Clear video display
-        self.video_label.configure(image="", text="Camera feed will appear here")
+        self.video_canvas.itemconfigure(self._img_item, image="")
+        for overlay in self._hand_overlays:
+            self.video_canvas.itemconfigure(overlay['tag'], state=tk.HIDDEN)
+        self.video_canvas.itemconfigure(self._placeholder_item, state=tk.NORMAL)
+        self._video_image = None
     
     def _on_volume_change(self, value):
         """Handle volume slider change"""
@@ -193,7 +241,9 @@ Instructions:
             )
             
             if file_path:
-                self.app.midi_generator.save_midi_file()
+                if not self.app.midi_generator.save_midi_file():
+                    self.show_error("Failed to save MIDI: the MIDI data could not be written")
+                    return
                 
                 # Copy to user-specified location
                 import shutil
@@ -240,44 +290,146 @@ Instructions:
         close_button = ttk.Button(settings_window, text="Close", command=settings_window.destroy)
         close_button.pack(pady=20)
     
-    def update_video_frame(self, frame):
-        """Update video display with new frame"""
+    def mirror_preview(self, frame):
+        """
+        Mirror and downscale a camera frame into the preview buffer
+        
+        Flip and resize are done by a single remap pass over the frame. The
+        returned buffer is reused, so it must not be passed in again before
+        update_video_frame has displayed it.
+        """
+        # Camera resolution differs from the configured one
+        if frame.shape[:2] != self._preview_source:
+            self._allocate_preview_buffers(frame.shape[1], frame.shape[0])
+        
+        return cv2.remap(frame, *self._preview_map, cv2.INTER_LINEAR,
+                         dst=self._preview_buf)
+    
+    def update_video_frame(self, frame, hands=None, on_rendered=None):
+        """
+        Update video display with new frame
+        
+        frame is a BGR preview from mirror_preview, and hands is the hand
+        tracker output for it, drawn as a canvas overlay. The canvas is
+        updated from the Tk event loop; on_rendered is called once the frame
+        has been displayed. Errors propagate to the caller, which then has
+        to call on_rendered itself.
+        
+        Safe to call from worker threads: the frame is encoded here, and the
+        only Tk call is after_idle, which hands it to _show_video_image.
+        """
+        display_width = self._preview_width
+        display_height = self._preview_height
+        
+        # Convert from BGR to RGB on the small preview only
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+        
+        # Encode as binary PPM, which Tk reads without going through PIL;
+        # Tk only accepts bytes, so join copies the pixels exactly once
+        ppm_data = b"".join((self._ppm_header, rgb_frame.data))
+        
+        # Overlay coordinates in preview pixels
+        scale = display_width / self._preview_source[1]
+        overlay = [self._overlay_coords(hand_data, scale)
+                   for hand_data in (hands or ())[:len(self._hand_overlays)]]
+        
+        # Update canvas when Tk is idle
+        self.root.after_idle(self._show_video_image, ppm_data, overlay,
+                             display_width, display_height, on_rendered)
+    
+    def _allocate_preview_buffers(self, frame_width, frame_height):
+        """Compute the preview size for a camera resolution and allocate its buffers"""
+        self._preview_source = (frame_height, frame_width)
+        aspect_ratio = frame_width / frame_height
+        self._preview_width = int(self._preview_height * aspect_ratio)
+        
+        buffer_shape = (self._preview_height, self._preview_width, 3)
+        self._preview_buf = np.empty(buffer_shape, dtype=np.uint8)
+        self._rgb_buf = np.empty(buffer_shape, dtype=np.uint8)
+        self._ppm_header = f"P6 {self._preview_width} {self._preview_height} 255 ".encode()
+        
+        # Source pixel for each preview pixel, mirrored horizontally and
+        # sampled at pixel centers; fixed-point maps make remap faster
+        scale_x = frame_width / self._preview_width
+        scale_y = frame_height / self._preview_height
+        source_x = (frame_width - 0.5) - (np.arange(self._preview_width) + 0.5) * scale_x
+        source_y = (np.arange(self._preview_height) + 0.5) * scale_y - 0.5
+        map_x, map_y = np.meshgrid(source_x.astype(np.float32), source_y.astype(np.float32))
+        self._preview_map = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+    
+    @staticmethod
+    def _overlay_coords(hand_data, scale):
+        """Compute the canvas item coordinates for one hand"""
+        points = hand_data['landmarks'] * scale
+        dots = np.hstack((points - LANDMARK_RADIUS, points + LANDMARK_RADIUS))
+        center_x, center_y = (value * scale for value in hand_data['center'])
+        x, y, w, h = (value * scale for value in hand_data['bounding_box'])
+        
+        return {
+            'landmarks': dots.tolist(),
+            'connections': [points[chain].ravel().tolist() for chain in CONNECTION_CHAINS],
+            'center': (center_x - CENTER_RADIUS, center_y - CENTER_RADIUS,
+                       center_x + CENTER_RADIUS, center_y + CENTER_RADIUS),
+            'bbox': (x, y, x + w, y + h),
+            'label': (x, y - 5),
+            'handedness': hand_data['handedness']
+        }
+    
+    def _show_video_image(self, ppm_data, overlay, width, height, on_rendered):
+        """Display a prepared PPM video frame and its overlay (runs in the Tk event loop)"""
         try:
-            # Resize frame for display
-            display_height = 400
-            aspect_ratio = frame.shape[1] / frame.shape[0]
-            display_width = int(display_height * aspect_ratio)
-            
-            resized_frame = cv2.resize(frame, (display_width, display_height))
-            
-            # Convert from BGR to RGB
-            rgb_frame = cv2.cvtColor(resized_frame, cv2.COLOR_BGR2RGB)
-            
-            # Convert to PIL Image
-            pil_image = Image.fromarray(rgb_frame)
-            
-            # Convert to Tkinter format
-            tk_image = ImageTk.PhotoImage(pil_image)
-            
-            # Update label
-            self.video_label.configure(image=tk_image, text="")
-            self.video_label.image = tk_image  # Keep reference
+            if self.is_tracking:
+                # Create the photo image once and reload its pixels for each frame
+                if (self._video_image is None or
+                        (self._video_image.width(), self._video_image.height()) != (width, height)):
+                    self._video_image = tk.PhotoImage(width=width, height=height)
+                    self.video_canvas.configure(width=width, height=height)
+                    self.video_canvas.itemconfigure(self._img_item, image=self._video_image)
+                    self.video_canvas.itemconfigure(self._placeholder_item, state=tk.HIDDEN)
+                self._video_image.configure(data=ppm_data, format="PPM")
+                self._move_hand_overlays(overlay)
+        finally:
+            if on_rendered:
+                on_rendered()
+    
+    def _move_hand_overlays(self, overlay):
+        """Move the existing overlay items to the new hand positions"""
+        canvas = self.video_canvas
+        for index, items in enumerate(self._hand_overlays):
+            if index >= len(overlay):
+                canvas.itemconfigure(items['tag'], state=tk.HIDDEN)
+                continue
             
-        except Exception as e:
-            print(f"Error updating video frame: {e}")
+            coords = overlay[index]
+            for item, dot in zip(items['landmarks'], coords['landmarks']):
+                canvas.coords(item, dot)
+            for item, line in zip(items['connections'], coords['connections']):
+                canvas.coords(item, line)
+            canvas.coords(items['center'], coords['center'])
+            canvas.coords(items['bbox'], coords['bbox'])
+            canvas.coords(items['label'], coords['label'])
+            canvas.itemconfigure(items['label'], text=coords['handedness'])
+            canvas.itemconfigure(items['tag'], state=tk.NORMAL)
     
     def _log_message(self, message):
         """Add message to metrics text area"""
         timestamp = time.strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\n"
-        
-        # Add to metrics text
-        self.metrics_text.insert(tk.END, log_entry)
+        self._append_log(f"[{timestamp}] {message}")
+    
+    def _append_log(self, entry):
+        """Store a metrics panel entry and schedule a redraw"""
+        self._log.append(entry)
+        
+        # Redraw at most every 100 ms, however many entries arrive
+        if not self._log_flush_pending:
+            self._log_flush_pending = True
+            self.root.after(100, self._flush_log)
+    
+    def _flush_log(self):
+        """Redraw the metrics text from the stored entries"""
+        self._log_flush_pending = False
+        self.metrics_text.replace('1.0', tk.END, '\n'.join(self._log) + '\n')
         self.metrics_text.see(tk.END)
-        
-        # Limit text length
-        if self.metrics_text.index(tk.END).split('.')[0] > '100':
-            self.metrics_text.delete('1.0', '10.0')
     
     def show_error(self, message):
         """Show error message dialog"""
@@ -305,10 +457,9 @@ Instructions:
         current_time = time.strftime("%H:%M:%S")
         
         # Format metrics
-        metrics_text = f"[{current_time}] Performance Metrics:\n"
+        metrics_text = f"[{current_time}] Performance Metrics:"
         for key, value in metrics_dict.items():
-            metrics_text += f"  {key}: {value}\n"
+            metrics_text += f"\n  {key}: {value}"
         
         # Add to display
-        self.metrics_text.insert(tk.END, metrics_text)
-        self.metrics_text.see(tk.END)
+        self._append_log(metrics_text)
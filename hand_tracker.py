@@ -3,34 +3,116 @@ Hand tracking module using MediaPipe
 Handles real-time hand detection and landmark extraction
 """
 
+import math
 import cv2
-import mediapipe as mp
 import numpy as np
 from typing import List, Optional, Tuple
+from config import Config
+from jit_support import NUMBA_AVAILABLE, njit, warm_up
+
+# MediaPipe hand landmark indices, per finger in _FINGER_NAMES order
+_FINGER_NAMES = ('thumb', 'index', 'middle', 'ring', 'pinky')
+_FINGER_TIP_IDX = (4, 8, 12, 16, 20)
+_FINGER_PIP_IDX = (3, 6, 10, 14, 18)
+_FINGER_MCP_IDX = (2, 5, 9, 13, 17)
+_WRIST_IDX = 0
+
+# Tip / PIP index arrays for the fingers other than the thumb
+_NON_THUMB_TIP_IDX = np.array(_FINGER_TIP_IDX[1:])
+_NON_THUMB_PIP_IDX = np.array(_FINGER_PIP_IDX[1:])
+
+# Landmark chains drawn as connected polylines
+CONNECTION_CHAINS = (
+    np.array([0, 1, 2, 3, 4]),      # Thumb
+    np.array([0, 5, 6, 7, 8]),      # Index finger
+    np.array([0, 9, 10, 11, 12]),   # Middle finger
+    np.array([0, 13, 14, 15, 16]),  # Ring finger
+    np.array([0, 17, 18, 19, 20]),  # Pinky
+    np.array([5, 9, 13, 17])        # Palm
+)
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _gesture_feature_kernel(landmarks):
+        """
+        Finger mask and orientation features from a (21, 2) landmark array
+        
+        Returns (finger_mask, hand_angle, hand_size, palm_x, palm_y) with the
+        same meaning as HandTracker._extract_gesture_features
+        """
+        wrist_x = np.float64(landmarks[_WRIST_IDX, 0])
+        wrist_y = np.float64(landmarks[_WRIST_IDX, 1])
+        
+        # Thumb is extended if its tip is further from the wrist than its MCP
+        finger_mask = 0
+        if (abs(landmarks[_FINGER_TIP_IDX[0], 0] - landmarks[_WRIST_IDX, 0]) >
+                abs(landmarks[_FINGER_MCP_IDX[0], 0] - landmarks[_WRIST_IDX, 0])):
+            finger_mask |= 1
+        
+        # Other fingers are extended if the tip is above the PIP joint
+        for bit in range(1, 5):
+            if landmarks[_FINGER_TIP_IDX[bit], 1] < landmarks[_FINGER_PIP_IDX[bit], 1]:
+                finger_mask |= 1 << bit
+        
+        palm_x = np.float64(landmarks[_FINGER_MCP_IDX[2], 0])
+        palm_y = np.float64(landmarks[_FINGER_MCP_IDX[2], 1])
+        tip_x = np.float64(landmarks[_FINGER_TIP_IDX[2], 0])
+        tip_y = np.float64(landmarks[_FINGER_TIP_IDX[2], 1])
+        
+        hand_angle = math.atan2(palm_y - wrist_y, palm_x - wrist_x)
+        hand_size = math.hypot(tip_x - wrist_x, tip_y - wrist_y)
+        
+        return finger_mask, hand_angle, hand_size, palm_x, palm_y
+
+# Frames are processed unmirrored, so MediaPipe's selfie-view labels are swapped
+_MIRRORED_HANDEDNESS = {'Left': 'Right', 'Right': 'Left'}
 
 class HandTracker:
+    # MediaPipe Hands graph shared by all trackers, so it is only loaded once
+    _shared_hands = None
+    
     def __init__(self):
+        # MediaPipe loads TensorFlow Lite, so it is only imported once a tracker is needed
+        import mediapipe as mp
+        
         # Initialize MediaPipe hands
         self.mp_hands = mp.solutions.hands
         self.mp_drawing = mp.solutions.drawing_utils
         self.mp_drawing_styles = mp.solutions.drawing_styles
         
         # Configure hand detection
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=2,
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.5
-        )
+        self.hands = self._get_hands()
         
         self.hand_landmarks = []
         self.frame_height = 0
         self.frame_width = 0
+        
+        # RGB conversion buffer, allocated on the first frame
+        self._rgb_buf = None
+        
+        warm_up(lambda: _gesture_feature_kernel(np.zeros((21, 2), dtype=np.float32)))
+    
+    @classmethod
+    def _get_hands(cls):
+        """Get the shared MediaPipe Hands graph, creating it on first use"""
+        if cls._shared_hands is None:
+            import mediapipe as mp
+            cls._shared_hands = mp.solutions.hands.Hands(
+                static_image_mode=False,
+                max_num_hands=Config.MAX_HANDS,
+                model_complexity=Config.MODEL_COMPLEXITY,
+                min_detection_confidence=Config.MIN_DETECTION_CONFIDENCE,
+                min_tracking_confidence=Config.MIN_TRACKING_CONFIDENCE
+            )
+        return cls._shared_hands
     
     def process_frame(self, frame: np.ndarray) -> List[dict]:
         """
         Process a single frame and extract hand landmarks
         
+        The frame is processed as captured, but all returned coordinates and
+        handedness labels are for the horizontally mirrored (selfie) view.
+        
         Args:
             frame: Input BGR frame from camera
             
@@ -39,11 +121,15 @@ class HandTracker:
         """
         self.frame_height, self.frame_width = frame.shape[:2]
         
-        # Convert BGR to RGB for MediaPipe
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # Convert BGR to RGB for MediaPipe into a reused buffer
+        if self._rgb_buf is None or self._rgb_buf.shape != frame.shape:
+            self._rgb_buf = np.empty(frame.shape, dtype=np.uint8)
+        self._rgb_buf.flags.writeable = True
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
         
-        # Process frame
-        results = self.hands.process(rgb_frame)
+        # Process frame (read-only input lets MediaPipe skip its own copy)
+        self._rgb_buf.flags.writeable = False
+        results = self.hands.process(self._rgb_buf)
         
         hand_data_list = []
         
@@ -52,7 +138,8 @@ class HandTracker:
                 # Get hand classification (Left/Right)
                 handedness = "Unknown"
                 if results.multi_handedness:
-                    handedness = results.multi_handedness[idx].classification[0].label
+                    label = results.multi_handedness[idx].classification[0].label
+                    handedness = _MIRRORED_HANDEDNESS.get(label, label)
                 
                 # Extract landmark coordinates
                 landmarks = self._extract_landmarks(hand_landmarks)
@@ -72,177 +159,96 @@ class HandTracker:
         self.hand_landmarks = hand_data_list
         return hand_data_list
     
-    def _extract_landmarks(self, hand_landmarks) -> List[Tuple[float, float]]:
-        """Extract normalized landmark coordinates"""
-        landmarks = []
-        for landmark in hand_landmarks.landmark:
-            x = landmark.x * self.frame_width
-            y = landmark.y * self.frame_height
-            landmarks.append((x, y))
-        return landmarks
+    def _extract_landmarks(self, hand_landmarks) -> np.ndarray:
+        """Extract mirrored-view landmark coordinates in pixels as a (21, 2) array"""
+        normalized = np.array([(landmark.x, landmark.y) for landmark in hand_landmarks.landmark],
+                              dtype=np.float32)
+        
+        # x is flipped here instead of flipping the whole frame before processing
+        pixels = normalized * np.array([-self.frame_width, self.frame_height], dtype=np.float32)
+        pixels[:, 0] += self.frame_width
+        return pixels
     
-    def _calculate_center(self, landmarks: List[Tuple[float, float]]) -> Tuple[float, float]:
+    def _calculate_center(self, landmarks: np.ndarray) -> Tuple[float, float]:
         """Calculate center point of hand"""
-        if not landmarks:
+        if len(landmarks) == 0:
             return (0, 0)
         
-        x_coords = [point[0] for point in landmarks]
-        y_coords = [point[1] for point in landmarks]
-        
-        center_x = sum(x_coords) / len(x_coords)
-        center_y = sum(y_coords) / len(y_coords)
+        center_x, center_y = landmarks.mean(axis=0).tolist()
         
         return (center_x, center_y)
     
-    def _calculate_bounding_box(self, landmarks: List[Tuple[float, float]]) -> Tuple[int, int, int, int]:
+    def _calculate_bounding_box(self, landmarks: np.ndarray) -> Tuple[int, int, int, int]:
         """Calculate bounding box around hand"""
-        if not landmarks:
+        if len(landmarks) == 0:
             return (0, 0, 0, 0)
         
-        x_coords = [point[0] for point in landmarks]
-        y_coords = [point[1] for point in landmarks]
-        
-        min_x, max_x = int(min(x_coords)), int(max(x_coords))
-        min_y, max_y = int(min(y_coords)), int(max(y_coords))
+        min_x, min_y = landmarks.min(axis=0).astype(int).tolist()
+        max_x, max_y = landmarks.max(axis=0).astype(int).tolist()
         
         return (min_x, min_y, max_x - min_x, max_y - min_y)
     
-    def _get_finger_positions(self, landmarks: List[Tuple[float, float]]) -> dict:
+    def _get_finger_positions(self, landmarks: np.ndarray) -> dict:
         """Get positions of finger tips and important points"""
         if len(landmarks) < 21:
             return {}
         
-        # MediaPipe hand landmark indices
-        finger_tips = {
-            'thumb': landmarks[4],
-            'index': landmarks[8],
-            'middle': landmarks[12],
-            'ring': landmarks[16],
-            'pinky': landmarks[20]
-        }
-        
-        finger_mcp = {
-            'thumb': landmarks[2],
-            'index': landmarks[5],
-            'middle': landmarks[9],
-            'ring': landmarks[13],
-            'pinky': landmarks[17]
-        }
+        # Plain (x, y) tuples for consumers of the hand data
+        points = [tuple(point) for point in landmarks.tolist()]
         
         return {
-            'tips': finger_tips,
-            'mcp': finger_mcp,
-            'wrist': landmarks[0]
+            'tips': {name: points[idx] for name, idx in zip(_FINGER_NAMES, _FINGER_TIP_IDX)},
+            'mcp': {name: points[idx] for name, idx in zip(_FINGER_NAMES, _FINGER_MCP_IDX)},
+            'wrist': points[_WRIST_IDX]
         }
     
-    def _extract_gesture_features(self, landmarks: List[Tuple[float, float]]) -> dict:
+    def _extract_gesture_features(self, landmarks: np.ndarray) -> dict:
         """Extract features for gesture recognition"""
         if len(landmarks) < 21:
             return {}
         
-        # Calculate finger extension states
-        finger_states = self._calculate_finger_states(landmarks)
-        
-        # Calculate hand orientation
-        wrist = landmarks[0]
-        middle_mcp = landmarks[9]
-        hand_vector = (middle_mcp[0] - wrist[0], middle_mcp[1] - wrist[1])
-        hand_angle = np.arctan2(hand_vector[1], hand_vector[0])
-        
-        # Calculate hand size (distance from wrist to middle finger tip)
-        middle_tip = landmarks[12]
-        hand_size = np.sqrt((middle_tip[0] - wrist[0])**2 + (middle_tip[1] - wrist[1])**2)
+        if NUMBA_AVAILABLE:
+            # Finger states and orientation from a single compiled pass
+            finger_mask, hand_angle, hand_size, palm_x, palm_y = \
+                _gesture_feature_kernel(landmarks)
+            middle_mcp = (palm_x, palm_y)
+        else:
+            # Calculate finger extension states
+            finger_mask = self._calculate_finger_mask(landmarks)
+            
+            # Pull the few points needed below out as Python floats for scalar math
+            wrist, middle_mcp, middle_tip = landmarks[[_WRIST_IDX, _FINGER_MCP_IDX[2],
+                                                       _FINGER_TIP_IDX[2]]].tolist()
+            
+            # Calculate hand orientation
+            hand_angle = math.atan2(middle_mcp[1] - wrist[1], middle_mcp[0] - wrist[0])
+            
+            # Calculate hand size (distance from wrist to middle finger tip)
+            hand_size = math.hypot(middle_tip[0] - wrist[0], middle_tip[1] - wrist[1])
         
         return {
-            'finger_states': finger_states,
+            'finger_states': self.unpack_states(finger_mask),
+            'finger_mask': finger_mask,
             'hand_angle': hand_angle,
             'hand_size': hand_size,
-            'palm_center': landmarks[9]  # Middle finger MCP as palm center
-        }
-    
-    def _calculate_finger_states(self, landmarks: List[Tuple[float, float]]) -> dict:
-        """Determine if fingers are extended or folded"""
-        finger_states = {}
-        
-        # Finger tip and PIP joint indices
-        fingers = {
-            'thumb': (4, 3),
-            'index': (8, 6),
-            'middle': (12, 10),
-            'ring': (16, 14),
-            'pinky': (20, 18)
+            'palm_center': tuple(middle_mcp)  # Middle finger MCP as palm center
         }
-        
-        for finger_name, (tip_idx, pip_idx) in fingers.items():
-            tip = landmarks[tip_idx]
-            pip = landmarks[pip_idx]
-            
-            # For thumb, use different logic (horizontal movement)
-            if finger_name == 'thumb':
-                mcp = landmarks[2]
-                # Thumb is extended if tip is further from palm than MCP
-                tip_distance = abs(tip[0] - landmarks[0][0])
-                mcp_distance = abs(mcp[0] - landmarks[0][0])
-                finger_states[finger_name] = tip_distance > mcp_distance
-            else:
-                # For other fingers, check if tip is above PIP joint
-                finger_states[finger_name] = tip[1] < pip[1]
-        
-        return finger_states
     
-    def draw_landmarks(self, frame: np.ndarray) -> np.ndarray:
-        """Draw hand landmarks on frame"""
-        annotated_frame = frame.copy()
-        
-        if self.hand_landmarks:
-            for hand_data in self.hand_landmarks:
-                landmarks = hand_data['landmarks']
-                
-                # Draw landmarks
-                for point in landmarks:
-                    cv2.circle(annotated_frame, (int(point[0]), int(point[1])), 3, (0, 255, 0), -1)
-                
-                # Draw connections between landmarks
-                self._draw_connections(annotated_frame, landmarks)
-                
-                # Draw hand center
-                center = hand_data['center']
-                cv2.circle(annotated_frame, (int(center[0]), int(center[1])), 8, (255, 0, 0), -1)
-                
-                # Draw bounding box
-                bbox = hand_data['bounding_box']
-                cv2.rectangle(annotated_frame, 
-                            (bbox[0], bbox[1]), 
-                            (bbox[0] + bbox[2], bbox[1] + bbox[3]), 
-                            (255, 255, 0), 2)
-                
-                # Display handedness
-                cv2.putText(annotated_frame, hand_data['handedness'], 
-                          (bbox[0], bbox[1] - 10), 
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        
-        return annotated_frame
+    def _calculate_finger_mask(self, landmarks: np.ndarray) -> int:
+        """Pack finger extension states into a bitmask (bit i = _FINGER_NAMES[i] extended)"""
+        # For thumb, use different logic (horizontal movement):
+        # thumb is extended if tip is further from palm than MCP
+        wrist_x = landmarks[_WRIST_IDX, 0]
+        thumb_extended = (abs(landmarks[_FINGER_TIP_IDX[0], 0] - wrist_x) >
+                          abs(landmarks[_FINGER_MCP_IDX[0], 0] - wrist_x))
+        
+        # For other fingers, check if tip is above PIP joint
+        fingers_extended = landmarks[_NON_THUMB_TIP_IDX, 1] < landmarks[_NON_THUMB_PIP_IDX, 1]
+        finger_bits = int(np.packbits(fingers_extended, bitorder='little')[0])
+        
+        return (finger_bits << 1) | int(thumb_extended)
     
-    def _draw_connections(self, frame: np.ndarray, landmarks: List[Tuple[float, float]]):
-        """Draw connections between hand landmarks"""
-        # Define connections between landmarks
-        connections = [
-            # Thumb
-            (0, 1), (1, 2), (2, 3), (3, 4),
-            # Index finger
-            (0, 5), (5, 6), (6, 7), (7, 8),
-            # Middle finger
-            (0, 9), (9, 10), (10, 11), (11, 12),
-            # Ring finger
-            (0, 13), (13, 14), (14, 15), (15, 16),
-            # Pinky
-            (0, 17), (17, 18), (18, 19), (19, 20),
-            # Palm
-            (5, 9), (9, 13), (13, 17)
-        ]
-        
-        for start_idx, end_idx in connections:
-            if start_idx < len(landmarks) and end_idx < len(landmarks):
-                start_point = (int(landmarks[start_idx][0]), int(landmarks[start_idx][1]))
-                end_point = (int(landmarks[end_idx][0]), int(landmarks[end_idx][1]))
-                cv2.line(frame, start_point, end_point, (0, 255, 255), 2)
+    @staticmethod
+    def unpack_states(finger_mask: int) -> dict:
+        """Expand a finger bitmask into a {finger name: extended} dict"""
+        return {name: bool(finger_mask >> bit & 1) for bit, name in enumerate(_FINGER_NAMES)}
@@ -0,0 +1,25 @@
+"""
+Optional Numba support
+Compiled kernels are used when Numba is installed; every caller keeps a
+NumPy fallback for when it is not
+"""
+
+from typing import Callable
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    njit = prange = None
+    NUMBA_AVAILABLE = False
+
+def warm_up(compile_call: Callable[[], object]):
+    """
+    Run a compiled code path once at startup so its first real call does not stall
+    
+    Args:
+        compile_call: Function running the kernel with arguments of the types
+            used later; not called when Numba is unavailable
+    """
+    if NUMBA_AVAILABLE:
+        compile_call()
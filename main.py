@@ -5,9 +5,13 @@ Main application entry point
 """
 
 import sys
+import logging
 import cv2
 import threading
 import time
+import collections
+import statistics
+from typing import Optional
 from gui_interface import MusicCreatorGUI
 from hand_tracker import HandTracker
 from gesture_recognizer import GestureRecognizer
@@ -15,14 +19,83 @@ from midi_generator import MIDIGenerator
 from audio_engine import AudioEngine
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+class _LoopErrors:
+    """Consecutive error count of a worker loop, logged at most once a second"""
+    
+    def __init__(self, name: str, limit: Optional[int] = None):
+        self.name = name
+        self.limit = limit
+        self.count = 0
+        self._last_log = 0.0
+    
+    def reset(self):
+        """Record a successful iteration"""
+        self.count = 0
+    
+    def failed(self, message: str, exc_info: bool = True) -> bool:
+        """
+        Record a failed iteration, logging it unless one was logged within a second
+        
+        Args:
+            message: Description of the failure
+            exc_info: Whether to log the exception being handled
+            
+        Returns:
+            True once the consecutive error limit (if any) is reached
+        """
+        self.count += 1
+        now = time.perf_counter()
+        if now - self._last_log >= 1.0:
+            logger.error("%s: %s (%d in a row)", self.name, message, self.count,
+                         exc_info=exc_info)
+            self._last_log = now
+        
+        if self.limit is not None and self.count >= self.limit:
+            logger.error("Stopping %s after %d consecutive errors", self.name, self.count)
+            return True
+        return False
+
 class MotionMusicApp:
     def __init__(self):
         self.config = Config()
         self.running = False
         self.camera = None
         
+        # Only one tracking loop may run at a time: MIDI note state is owned
+        # by the thread that calls process_gestures
+        self.tracking_thread = None
+        
+        # Set by the GUI once the previous video frame has been displayed
+        self._gui_ready = threading.Event()
+        
+        # Single-slot exchange of the latest camera frame between the
+        # capture thread and the tracking thread
+        self.capture_thread = None
+        self._frame_lock = threading.Lock()
+        self._latest_frame = None
+        self._frame_wanted = threading.Event()
+        self._frame_ready = threading.Event()
+        
+        # Two capture buffers used in turn: the camera decodes into one while
+        # the tracking thread still holds the frame in the other
+        self._capture_bufs = [None, None]
+        self._capture_idx = 0
+        
+        # Mirrored preview of the frame shown in the GUI, handed with its hand
+        # data from the tracking thread to the display thread
+        self.display_thread = None
+        self._display_session = 0  # Bumped per start; older display loops exit
+        self._display_lock = threading.Lock()
+        self._display_item = None
+        self._display_ready = threading.Event()
+        
+        # Recent oversleep of the frame pacing sleep (~10 s of frames)
+        self._sleep_errors = collections.deque(maxlen=10 * self.config.CAMERA_FPS)
+        
         # Initialize components
-        self.hand_tracker = HandTracker()
+        self.hand_tracker = None  # Created on first start, MediaPipe is slow to load
         self.gesture_recognizer = GestureRecognizer()
         self.midi_generator = MIDIGenerator()
         self.audio_engine = AudioEngine()
@@ -37,11 +110,16 @@ class MotionMusicApp:
             if not self.camera.isOpened():
                 raise Exception("Cannot access camera")
             
-            # Set camera properties for better performance
+            # Set camera properties for better performance; the pixel format
+            # has to be chosen before the resolution
+            self.camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.config.CAMERA_FOURCC))
             self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.config.CAMERA_WIDTH)
             self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.config.CAMERA_HEIGHT)
             self.camera.set(cv2.CAP_PROP_FPS, self.config.CAMERA_FPS)
             
+            # Keep only the newest frame in the driver queue
+            self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            
             return True
         except Exception as e:
             print(f"Camera initialization error: {e}")
@@ -49,19 +127,43 @@ class MotionMusicApp:
     
     def stop_camera(self):
         """Stop camera capture and release resources"""
+        # The capture thread owns the camera while it runs
+        if self.capture_thread and self.capture_thread is not threading.current_thread():
+            self.capture_thread.join(timeout=1.0)
+        self.capture_thread = None
+        
         if self.camera:
             self.camera.release()
             self.camera = None
     
     def start_tracking(self):
         """Start the hand tracking and music generation process"""
+        if self.tracking_thread is not None and self.tracking_thread.is_alive():
+            self.gui.show_error("Previous tracking session is still stopping")
+            return
+        
+        if self.hand_tracker is None:
+            self.hand_tracker = HandTracker()
+        
         if not self.start_camera():
             self.gui.show_error("Failed to initialize camera")
             return
         
         self.running = True
+        self._gui_ready.set()
+        self._latest_frame = None
+        self._frame_ready.clear()
+        self._frame_wanted.set()
+        self._display_item = None
+        self._display_ready.clear()
+        self._display_session += 1
+        self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.capture_thread.start()
         self.tracking_thread = threading.Thread(target=self._tracking_loop, daemon=True)
         self.tracking_thread.start()
+        self.display_thread = threading.Thread(target=self._display_loop,
+                                               args=(self._display_session,), daemon=True)
+        self.display_thread.start()
         
         # Start audio engine
         self.audio_engine.start()
@@ -71,24 +173,92 @@ class MotionMusicApp:
     def stop_tracking(self):
         """Stop the tracking process"""
         self.running = False
+        
+        # Wait for the tracking thread so a quick restart cannot run two of
+        # them. The display thread is not joined: it may be waiting on the Tk
+        # thread, and exits by itself once its session is over
+        thread = self.tracking_thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+            if thread.is_alive():
+                logger.warning("Tracking thread did not stop within 1 s")
+            else:
+                self.tracking_thread = None
+        self.display_thread = None
+        
         self.stop_camera()
         self.audio_engine.stop()
         print("Motion tracking stopped")
     
+    def _capture_loop(self):
+        """Camera capture loop - runs in separate thread, keeps only the newest frame"""
+        errors = _LoopErrors("camera capture", self.config.MAX_TRACKING_ERRORS)
+        
+        while self.running and self.camera:
+            try:
+                if not self.camera.grab():
+                    failure = "grab failed"
+                else:
+                    # Only decode the grabbed frame when the tracking thread wants one
+                    if not self._frame_wanted.is_set():
+                        errors.reset()
+                        continue
+                    
+                    # Decode into the buffer the tracking thread is not using;
+                    # OpenCV reallocates it if the frame size changed
+                    ret, frame = self.camera.retrieve(self._capture_bufs[self._capture_idx])
+                    if ret:
+                        self._capture_bufs[self._capture_idx] = frame
+                        self._capture_idx ^= 1
+                        
+                        with self._frame_lock:
+                            self._latest_frame = frame
+                            self._frame_wanted.clear()
+                            self._frame_ready.set()
+                        
+                        errors.reset()
+                        continue
+                    failure = "retrieve failed"
+                
+                stop = errors.failed(failure, exc_info=False)
+            except Exception:
+                stop = errors.failed("capture error")
+            
+            if stop:
+                self.running = False
+                break
+            
+            # Back off before retrying a failing camera (10 ms doubling up to 0.5 s)
+            time.sleep(min(0.01 * 2 ** (errors.count - 1), 0.5))
+    
+    def _next_frame(self):
+        """Take the latest captured frame, or None if none arrived in time"""
+        self._frame_wanted.set()
+        if not self._frame_ready.wait(timeout=0.1):
+            return None
+        
+        with self._frame_lock:
+            frame = self._latest_frame
+            self._latest_frame = None
+            self._frame_ready.clear()
+        return frame
+    
     def _tracking_loop(self):
         """Main tracking loop - runs in separate thread"""
-        last_frame_time = time.time()
+        target_frame_time = 1.0 / self.config.CAMERA_FPS
+        last_frame_end = time.perf_counter()
         
-        while self.running and self.camera:
+        # Errors are logged at most once a second, so a failing camera
+        # cannot flood the output
+        errors = _LoopErrors("tracking", self.config.MAX_TRACKING_ERRORS)
+        
+        while self.running:
             try:
-                ret, frame = self.camera.read()
-                if not ret:
+                frame = self._next_frame()
+                if frame is None:
                     continue
                 
-                # Flip frame horizontally for mirror effect
-                frame = cv2.flip(frame, 1)
-                
-                # Track hands
+                # Track hands (landmarks come back in mirrored coordinates)
                 hand_landmarks = self.hand_tracker.process_frame(frame)
                 
                 if hand_landmarks:
@@ -103,26 +273,78 @@ class MotionMusicApp:
                         for event in midi_events:
                             self.audio_engine.play_note(event)
                 
-                # Draw hand landmarks on frame
-                annotated_frame = self.hand_tracker.draw_landmarks(frame)
+                # Only render when the GUI has shown the previous frame;
+                # tracking and MIDI still run on every frame
+                if self._gui_ready.is_set():
+                    self._gui_ready.clear()
+                    
+                    # Mirror and downscale only the frames that are shown; the
+                    # copy also frees the capture buffer for the next frame
+                    preview = self.gui.mirror_preview(frame)
+                    
+                    # Hand the frame to the display thread
+                    with self._display_lock:
+                        self._display_item = (preview, hand_landmarks)
+                        self._display_ready.set()
                 
-                # Update GUI with frame
-                self.gui.update_video_frame(annotated_frame)
+                errors.reset()
                 
                 # Control frame rate
-                current_time = time.time()
-                frame_time = current_time - last_frame_time
-                target_frame_time = 1.0 / self.config.CAMERA_FPS
+                last_frame_end = self._pace_frame(last_frame_end, target_frame_time)
                 
-                if frame_time < target_frame_time:
-                    time.sleep(target_frame_time - frame_time)
+            except Exception:
+                if errors.failed("tracking loop error"):
+                    self.running = False
+                    break
+                continue
+    
+    def _display_loop(self, session: int):
+        """Display loop - prepares preview frames for the GUI in a separate thread"""
+        errors = _LoopErrors("display")
+        
+        while self.running and session == self._display_session:
+            try:
+                if not self._display_ready.wait(timeout=0.1):
+                    continue
                 
-                last_frame_time = current_time
+                with self._display_lock:
+                    # A restart may have happened while this loop waited
+                    if session != self._display_session:
+                        break
+                    frame, hand_landmarks = self._display_item
+                    self._display_item = None
+                    self._display_ready.clear()
                 
-            except Exception as e:
-                print(f"Tracking loop error: {e}")
+                # Update GUI with frame; landmarks are drawn as a canvas overlay
+                self.gui.update_video_frame(frame, hands=hand_landmarks,
+                                            on_rendered=self._gui_ready.set)
+                errors.reset()
+                
+            except Exception:
+                # A failed preview only loses that frame, so the loop keeps going
+                errors.failed("display loop error")
+                self._gui_ready.set()
                 continue
     
+    def _pace_frame(self, last_frame_end, target_frame_time):
+        """
+        Sleep out the rest of the frame period
+        
+        The sleep is shortened by the median amount recent sleeps overshot,
+        so scheduler granularity does not push the loop below the target rate.
+        Returns the time the frame period ended.
+        """
+        processing_time = time.perf_counter() - last_frame_end
+        predicted_oversleep = statistics.median(self._sleep_errors) if self._sleep_errors else 0.0
+        sleep_time = target_frame_time - processing_time - predicted_oversleep
+        
+        if sleep_time > 0:
+            sleep_start = time.perf_counter()
+            time.sleep(sleep_time)
+            self._sleep_errors.append(time.perf_counter() - sleep_start - sleep_time)
+        
+        return time.perf_counter()
+    
     def run(self):
         """Run the application"""
         try:
@@ -134,5 +356,6 @@ class MotionMusicApp:
             cv2.destroyAllWindows()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG if Config.DEBUG_MODE else Config.LOG_LEVEL)
     app = MotionMusicApp()
     app.run()
@@ -3,50 +3,206 @@ MIDI generation module
 Converts gestures and hand movements into MIDI messages
 """
 
-import mido
+import functools
+import logging
+import numpy as np
+import struct
 import time
 import os
 import tempfile
 from typing import Dict, List, Optional, Tuple
-from threading import Lock
+from threading import Event, Lock, Thread
+from queue import SimpleQueue
+from jit_support import NUMBA_AVAILABLE, njit, warm_up
+
+logger = logging.getLogger(__name__)
+
+# Event type codes used in the per-frame event buffer
+NOTE_ON = 0
+NOTE_OFF = 1
+CONTROL_CHANGE = 2
+PITCHWHEEL = 3
+
+# Per type code: event dict builder taking (a, b, channel, timestamp), and
+# raw message encoder taking (channel, a, b) to (status, data1, data2)
+_EVENT_BUILDERS = (
+    lambda note, velocity, channel, timestamp: {
+        'type': 'note_on', 'note': note, 'velocity': velocity,
+        'channel': channel, 'timestamp': timestamp},
+    lambda note, velocity, channel, timestamp: {
+        'type': 'note_off', 'note': note, 'velocity': velocity,
+        'channel': channel, 'timestamp': timestamp},
+    lambda control, value, channel, timestamp: {
+        'type': 'control_change', 'control': control, 'value': value,
+        'channel': channel, 'timestamp': timestamp},
+    lambda pitch, _, channel, timestamp: {
+        'type': 'pitchwheel', 'pitch': pitch,
+        'channel': channel, 'timestamp': timestamp}
+)
+_RAW_ENCODERS = (
+    lambda channel, note, velocity: (0x90 | channel, note, velocity),
+    lambda channel, note, velocity: (0x80 | channel, note, velocity),
+    lambda channel, control, value: (0xB0 | channel, control, value),
+    # 14-bit pitch as LSB, MSB data bytes
+    lambda channel, pitch, _: (0xE0 | channel, pitch & 0x7F, pitch >> 7)
+)
+
+# Standard MIDI file resolution in ticks per quarter note
+_TICKS_PER_BEAT = 480
+
+# Header chunk of a single-track file, and the end of track meta event
+_SMF_HEADER = struct.pack('>4sIHHH', b'MThd', 6, 1, 1, _TICKS_PER_BEAT)
+_END_OF_TRACK = b'\x00\xff\x2f\x00'
+
+# Longest a save waits for the writer thread to catch up, in seconds
+_WRITER_SYNC_TIMEOUT = 2.0
+
+# One row per recorded MIDI message: raw bytes and tick delta
+_RECORD_DTYPE = np.dtype([('status', 'u1'), ('a', 'u1'), ('b', 'u1'), ('delta', 'u4')])
+
+# Most events one frame can produce: stop every note, start every note,
+# sustain and three controls
+_MAX_FRAME_EVENTS = 2 * 128 + 4
+
+# Continuous controls: gesture name, MIDI controller (None for the pitch
+# wheel) and the scale, bias and maximum mapping them to MIDI values
+_CTRL_NAMES = ('pitch_bend', 'modulation', 'volume')
+_CTRL_NUMBERS = (None, 1, 7)  # Pitch wheel, modulation wheel, main volume
+_CTRL_SCALE = np.array([8192.0, 127.0, 127.0])
+_CTRL_BIAS = np.array([8192.0, 0.0, 0.0])
+_CTRL_MAX = np.array([16383.0, 127.0, 127.0])
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _quantize_controls_kernel(values, scale, bias, max_values):
+        """
+        Scale, truncate and clip control values into their MIDI ranges
+        
+        Returns an int64 array with -1 for absent (NaN) controls
+        """
+        quantized = np.empty(values.shape[0], dtype=np.int64)
+        for i in range(values.shape[0]):
+            value = values[i]
+            if np.isnan(value):
+                quantized[i] = -1
+                continue
+            scaled = np.trunc(value * scale[i] + bias[i])
+            quantized[i] = np.int64(min(max(scaled, 0.0), max_values[i]))
+        return quantized
+
+# Chord intervals in semitones above the root
+_CHORD_INTERVALS = {
+    'major': (0, 4, 7),
+    'minor': (0, 3, 7),
+    'seventh': (0, 4, 7, 10),
+    'diminished': (0, 3, 6)
+}
+
+@functools.lru_cache(maxsize=128 * 8)
+def _chord_notes(root_note: int, chord_type: str) -> Tuple[int, ...]:
+    """Note numbers of a chord that fall in the MIDI range (unknown types are major)"""
+    intervals = _CHORD_INTERVALS.get(chord_type, _CHORD_INTERVALS['major'])
+    return tuple(root_note + interval for interval in intervals
+                 if 0 <= root_note + interval <= 127)
+
+def _clamp7(value: int) -> int:
+    """Saturate a value into the 7-bit MIDI data range"""
+    return 0 if value < 0 else (127 if value > 127 else value)
+
+def _clamp_velocity(value: int) -> int:
+    """Saturate a note-on velocity into 1..127 (0 would mean note off)"""
+    return 1 if value < 1 else (127 if value > 127 else value)
+
+@functools.lru_cache(maxsize=4096)
+def _encode_vlq(value: int) -> bytes:
+    """Encode a tick delta as a MIDI variable-length quantity"""
+    encoded = [value & 0x7F]
+    value >>= 7
+    while value:
+        encoded.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(encoded))
+
+def _mask_notes(mask: int) -> List[int]:
+    """List the note numbers set in a note bitmask, lowest first"""
+    notes = []
+    while mask:
+        lowest_bit = mask & -mask
+        notes.append(lowest_bit.bit_length() - 1)
+        mask ^= lowest_bit
+    return notes
 
 class MIDIGenerator:
     def __init__(self):
-        self.current_notes = set()  # Track currently playing notes
-        self.note_lock = Lock()
+        # Currently playing notes, bit n set while note n plays. Only the
+        # gesture thread updates the live mask, so no lock is needed; readers
+        # use the copy published after each frame (an int store is atomic)
+        self._active_mask = 0
+        self._published_mask = 0
+        self._clear_pending = False
         
         # MIDI settings
         self.default_velocity = 64
         self.default_channel = 0
         self.sustain_pedal = False
         
-        # Create temporary MIDI file for output
-        self.temp_dir = tempfile.mkdtemp()
-        self.midi_file_path = os.path.join(self.temp_dir, "motion_music.mid")
+        # Last value sent per continuous control (-1 before the first send)
+        self._last_cc = [-1] * len(_CTRL_NAMES)
+        
+        # Events of the current frame as parallel arrays; dicts are only
+        # built when the events are returned
+        self._evt_type = np.empty(_MAX_FRAME_EVENTS, dtype=np.int8)
+        self._evt_a = np.empty(_MAX_FRAME_EVENTS, dtype=np.int16)  # note, control or pitch
+        self._evt_b = np.empty(_MAX_FRAME_EVENTS, dtype=np.int16)  # velocity or value
+        self._evt_ch = np.empty(_MAX_FRAME_EVENTS, dtype=np.int8)
+        self._evt_info = [None] * _MAX_FRAME_EVENTS  # Source note data of note_on rows
+        self._evt_count = 0
+        
+        # Temporary MIDI output file, created on first save or path request
+        self.temp_dir = None
+        self.midi_file_path = None
         
-        # Initialize MIDI file
-        self.midi_file = mido.MidiFile()
-        self.track = mido.MidiTrack()
-        self.midi_file.tracks.append(self.track)
+        # Encoded track events (delta, status, data) written so far
+        self.track_data = bytearray()
         
         # Timing
-        self.last_event_time = time.time()
         self.tempo = 500000  # 120 BPM in microseconds per beat
         
+        # Ticks are counted from the session start so truncation never accumulates;
+        # ticks = ns * ticks per beat / (tempo us per beat * 1000)
+        self.start_ns = time.monotonic_ns()
+        self.last_event_tick = 0
+        self._tick_num = _TICKS_PER_BEAT
+        self._tick_den = self.tempo * 1000
+        
         # Add initial tempo and program change
         self._add_initial_setup()
         
-        print(f"MIDI Generator initialized. Output file: {self.midi_file_path}")
+        # Recorded messages as rows of a structured array grown by doubling;
+        # they are only encoded into the track when the file is saved
+        self._recorded = np.zeros(1024, dtype=_RECORD_DTYPE)
+        self._recorded_count = 0
+        self._recorded_lock = Lock()
+        
+        warm_up(lambda: _quantize_controls_kernel(np.zeros(len(_CTRL_NAMES)), _CTRL_SCALE,
+                                                  _CTRL_BIAS, _CTRL_MAX))
+        
+        # Frames of raw (type, a, b, channel) events are recorded by a writer
+        # thread, off the gesture processing thread
+        self._write_queue = SimpleQueue()
+        self._writer_thread = Thread(target=self._midi_writer_loop, daemon=True)
+        self._writer_thread.start()
+        
+        logger.debug("MIDI Generator initialized")
     
     def _add_initial_setup(self):
         """Add initial MIDI setup messages"""
         # Set tempo
-        tempo_msg = mido.MetaMessage('set_tempo', tempo=self.tempo)
-        self.track.append(tempo_msg)
+        self.track_data += b'\x00\xff\x51\x03' + self.tempo.to_bytes(3, 'big')
         
         # Set instrument (piano)
-        program_change = mido.Message('program_change', channel=self.default_channel, program=0)
-        self.track.append(program_change)
+        self.track_data += bytes((0, 0xC0 | self.default_channel, 0))
+        self._running_status = 0xC0 | self.default_channel
     
     def process_gestures(self, gestures: Dict) -> List[Dict]:
         """
@@ -58,237 +214,309 @@ class MIDIGenerator:
         Returns:
             List of MIDI event dictionaries
         """
-        midi_events = []
-        current_time = time.time()
-        
-        # Handle special gesture actions
+        # Idle frames (no new note, pedal or control value) emit nothing
         action = gestures.get('action')
+        quantized = self._quantize_controls(gestures.get('controls'))
+        if self._is_idle_frame(gestures.get('notes'), action, quantized):
+            return []
+        
+        self._evt_count = 0
+        
+        # One clock reading stamps every event of the frame
+        now_ns = time.monotonic_ns()
+        
+        # Saturate notes and velocities into MIDI range
+        notes = [(note_data, _clamp7(note_data['note_number']),
+                  _clamp_velocity(note_data.get('velocity', self.default_velocity)))
+                 for note_data in gestures.get('notes', [])
+                 if note_data.get('note_number') is not None]
+        
+        # Note state is only changed on this thread; other threads see the
+        # mask published at the end of the frame, and request clears
+        if self._clear_pending:
+            self._clear_pending = False
+            self._active_mask = 0
+        
+        # Handle special gesture actions; the pedal is only sent when it flips
         if action == 'stop_all_notes':
-            midi_events.extend(self._stop_all_notes())
+            self._stop_all_notes()
         elif action == 'sustain_notes':
-            self.sustain_pedal = True
-            midi_events.append(self._create_sustain_event(True))
-        else:
+            if not self.sustain_pedal:
+                self.sustain_pedal = True
+                self._create_sustain_event(True)
+        elif self.sustain_pedal:
             self.sustain_pedal = False
-            midi_events.append(self._create_sustain_event(False))
+            self._create_sustain_event(False)
         
         # Process note events
-        notes = gestures.get('notes', [])
-        for note_data in notes:
-            midi_event = self._create_note_event(note_data, current_time)
-            if midi_event:
-                midi_events.append(midi_event)
-        
+        active_mask = self._active_mask
+        for note_data, note_number, velocity in notes:
+            active_mask, _ = self._create_note_event(active_mask, note_number,
+                                                     velocity, note_data)
+        self._active_mask = active_mask
+        self._published_mask = active_mask
+    
         # Process control changes
-        controls = gestures.get('controls', {})
-        control_events = self._process_controls(controls)
-        midi_events.extend(control_events)
+        self._process_controls(quantized)
+        
+        return self._flush_events(now_ns)
+    
+    def _append_event(self, type_code: int, a: int, b: int,
+                      info: Optional[Dict] = None) -> int:
+        """Write an event into the frame buffer and return its row index"""
+        row = self._evt_count
+        self._evt_type[row] = type_code
+        self._evt_a[row] = a
+        self._evt_b[row] = b
+        self._evt_ch[row] = self.default_channel
+        self._evt_info[row] = info
+        self._evt_count = row + 1
+        return row
+    
+    def _flush_events(self, now_ns: int) -> List[Dict]:
+        """Add the buffered frame events to the MIDI file and return them as dicts"""
+        count = self._evt_count
+        timestamp = now_ns / 1e9  # Monotonic clock, in seconds
+        records = list(zip(self._evt_type[:count].tolist(), self._evt_a[:count].tolist(),
+                           self._evt_b[:count].tolist(), self._evt_ch[:count].tolist()))
+        midi_events = []
         
-        # Add events to MIDI file
-        for event in midi_events:
-            self._add_to_midi_file(event)
+        for row, (type_code, a, b, channel) in enumerate(records):
+            event = _EVENT_BUILDERS[type_code](a, b, channel, timestamp)
+            
+            if type_code == NOTE_ON:
+                note_data = self._evt_info[row]
+                self._evt_info[row] = None
+                event['note_name'] = note_data.get('note_name', f'Note_{a}')
+                event['finger'] = note_data.get('finger', 'unknown')
+            
+            midi_events.append(event)
         
+        self._add_batch_to_midi_file(records, now_ns)
+        self._evt_count = 0
         return midi_events
     
-    def _create_note_event(self, note_data: Dict, timestamp: float) -> Optional[Dict]:
-        """Create a MIDI note event from gesture data"""
-        note_number = note_data.get('note_number')
-        velocity = note_data.get('velocity', self.default_velocity)
-        
-        if note_number is None:
-            return None
-        
-        # Ensure note is in valid MIDI range
-        note_number = max(0, min(127, note_number))
-        velocity = max(1, min(127, velocity))
-        
-        with self.note_lock:
-            # Check if note is already playing
-            if note_number in self.current_notes:
-                # Note is already playing, don't trigger again
-                return None
-            
-            # Add note to currently playing set
-            self.current_notes.add(note_number)
+    def _create_note_event(self, active_mask: int, note_number: int, velocity: int,
+                           note_data: Dict) -> Tuple[int, Optional[int]]:
+        """
+        Buffer a MIDI note event for an in-range note
         
-        midi_event = {
-            'type': 'note_on',
-            'note': note_number,
-            'velocity': velocity,
-            'channel': self.default_channel,
-            'timestamp': timestamp,
-            'note_name': note_data.get('note_name', f'Note_{note_number}'),
-            'finger': note_data.get('finger', 'unknown')
-        }
+        Takes the playing-note mask and returns the updated mask with the new
+        row index (None when the note is already playing). The mask is owned
+        by the caller on the gesture thread.
+        """
+        note_bit = 1 << note_number
+        
+        # Check if note is already playing
+        if active_mask & note_bit:
+            # Note is already playing, don't trigger again
+            return active_mask, None
         
-        return midi_event
+        # Mark note as playing
+        return active_mask | note_bit, self._append_event(NOTE_ON, note_number,
+                                                           velocity, note_data)
     
-    def _stop_note(self, note_number: int) -> Dict:
-        """Create a note off event"""
-        with self.note_lock:
-            self.current_notes.discard(note_number)
+    def _stop_all_notes(self) -> List[int]:
+        """Stop all currently playing notes (gesture thread only)"""
+        # Take and clear the whole mask at once, then buffer the note offs
+        active_mask = self._active_mask
+        self._active_mask = 0
         
-        return {
-            'type': 'note_off',
-            'note': note_number,
-            'velocity': 0,
-            'channel': self.default_channel,
-            'timestamp': time.time()
-        }
+        return [self._append_event(NOTE_OFF, note_number, 0)
+                for note_number in _mask_notes(active_mask)]
+    
+    def _create_sustain_event(self, sustain_on: bool) -> int:
+        """Buffer a sustain pedal control event"""
+        # Control 64 is the sustain pedal
+        return self._append_event(CONTROL_CHANGE, 64, 127 if sustain_on else 0)
     
-    def _stop_all_notes(self) -> List[Dict]:
-        """Stop all currently playing notes"""
-        events = []
+    def _is_idle_frame(self, notes: Optional[List[Dict]], action: Optional[str],
+                       quantized: List[int]) -> bool:
+        """Whether a frame would change no note, pedal or control value"""
+        if self._clear_pending:
+            return False
         
-        with self.note_lock:
-            for note_number in list(self.current_notes):
-                events.append(self._stop_note(note_number))
-            self.current_notes.clear()
+        # Stopping notes or flipping the pedal
+        if action == 'stop_all_notes':
+            if self._active_mask:
+                return False
+        elif (action == 'sustain_notes') != self.sustain_pedal:
+            return False
         
-        return events
+        # Notes that are not already playing
+        active_mask = self._active_mask
+        for note_data in notes or ():
+            note_number = note_data.get('note_number')
+            if note_number is not None and not active_mask >> _clamp7(note_number) & 1:
+                return False
+        
+        # Control values other than the last ones sent
+        for value, last_value in zip(quantized, self._last_cc):
+            if value >= 0 and value != last_value:
+                return False
+        return True
     
-    def _create_sustain_event(self, sustain_on: bool) -> Dict:
-        """Create sustain pedal control event"""
-        return {
-            'type': 'control_change',
-            'control': 64,  # Sustain pedal
-            'value': 127 if sustain_on else 0,
-            'channel': self.default_channel,
-            'timestamp': time.time()
-        }
+    def _quantize_controls(self, controls: Optional[Dict]) -> List[int]:
+        """Scale continuous controls to MIDI values, -1 for absent controls"""
+        if not controls:
+            return [-1] * len(_CTRL_NAMES)
+        
+        # Scale and clip every control in one pass; NaN marks an absent control
+        values = np.array([controls.get(name, np.nan) for name in _CTRL_NAMES],
+                          dtype=np.float64)
+        np.abs(values[1:2], out=values[1:2])  # Modulation depth ignores direction
+        
+        if NUMBA_AVAILABLE:
+            return _quantize_controls_kernel(values, _CTRL_SCALE, _CTRL_BIAS,
+                                             _CTRL_MAX).tolist()
+        
+        present = ~np.isnan(values)
+        np.trunc(values * _CTRL_SCALE + _CTRL_BIAS, out=values)
+        np.clip(values, 0, _CTRL_MAX, out=values)
+        return np.where(present, values, -1).astype(np.int64).tolist()
     
-    def _process_controls(self, controls: Dict) -> List[Dict]:
-        """Process continuous control data"""
-        events = []
-        
-        # Pitch bend
-        if 'pitch_bend' in controls:
-            pitch_value = int(controls['pitch_bend'] * 8192 + 8192)  # Convert to MIDI range
-            pitch_value = max(0, min(16383, pitch_value))
-            
-            events.append({
-                'type': 'pitchwheel',
-                'pitch': pitch_value,
-                'channel': self.default_channel,
-                'timestamp': time.time()
-            })
-        
-        # Modulation
-        if 'modulation' in controls:
-            mod_value = int(abs(controls['modulation']) * 127)
-            mod_value = max(0, min(127, mod_value))
-            
-            events.append({
-                'type': 'control_change',
-                'control': 1,  # Modulation wheel
-                'value': mod_value,
-                'channel': self.default_channel,
-                'timestamp': time.time()
-            })
-        
-        # Volume
-        if 'volume' in controls:
-            vol_value = int(controls['volume'] * 127)
-            vol_value = max(0, min(127, vol_value))
-            
-            events.append({
-                'type': 'control_change',
-                'control': 7,  # Main volume
-                'value': vol_value,
-                'channel': self.default_channel,
-                'timestamp': time.time()
-            })
-        
-        return events
+    def _process_controls(self, quantized: List[int]) -> List[int]:
+        """Buffer events for quantized control values"""
+        # Unchanged values are not sent again
+        rows = []
+        last_cc = self._last_cc
+        for index, (control, value) in enumerate(zip(_CTRL_NUMBERS, quantized)):
+            if value < 0 or value == last_cc[index]:
+                continue
+            last_cc[index] = value
+            if control is None:
+                rows.append(self._append_event(PITCHWHEEL, value, 0))
+            else:
+                rows.append(self._append_event(CONTROL_CHANGE, control, value))
+        
+        return rows
     
-    def _add_to_midi_file(self, event: Dict):
-        """Add MIDI event to the output file"""
-        current_time = time.time()
-        delta_time = int((current_time - self.last_event_time) * 480)  # Convert to ticks
-        delta_time = max(0, delta_time)
+    def _add_batch_to_midi_file(self, records: List[Tuple[int, int, int, int]], now_ns: int):
+        """
+        Queue one frame of (type, a, b, channel) events for the output file
         
-        try:
-            event_type = event['type']
-            
-            if event_type == 'note_on':
-                msg = mido.Message('note_on',
-                                 channel=event['channel'],
-                                 note=event['note'],
-                                 velocity=event['velocity'],
-                                 time=delta_time)
-            
-            elif event_type == 'note_off':
-                msg = mido.Message('note_off',
-                                 channel=event['channel'],
-                                 note=event['note'],
-                                 velocity=event['velocity'],
-                                 time=delta_time)
+        The tick delta is computed once; the first event carries it and the
+        rest of the frame follows at delta 0.
+        """
+        if not records:
+            return
+        
+        # Convert to ticks in integer math; the monotonic clock never goes back
+        event_tick = (now_ns - self.start_ns) * self._tick_num // self._tick_den
+        
+        self._write_queue.put((records, event_tick - self.last_event_tick))
+        self.last_event_tick = event_tick
+    
+    def _midi_writer_loop(self):
+        """Record queued event batches as raw MIDI bytes"""
+        while True:
+            item = self._write_queue.get()
             
-            elif event_type == 'control_change':
-                msg = mido.Message('control_change',
-                                 channel=event['channel'],
-                                 control=event['control'],
-                                 value=event['value'],
-                                 time=delta_time)
+            # Flush marker from _sync_writer
+            if isinstance(item, Event):
+                item.set()
+                continue
             
-            elif event_type == 'pitchwheel':
-                msg = mido.Message('pitchwheel',
-                                 channel=event['channel'],
-                                 pitch=event['pitch'],
-                                 time=delta_time)
+            # A bad batch is dropped rather than ending the thread
+            try:
+                self._record_batch(*item)
+            except Exception as e:
+                logger.warning("Dropped MIDI batch: %s", e)
+    
+    def _record_batch(self, records: List[Tuple[int, int, int, int]], delta_time: int):
+        """Append one frame of events to the recorded rows (writer thread)"""
+        rows = [_RAW_ENCODERS[type_code](channel, a, b) + (0,)
+                for type_code, a, b, channel in records]
+        
+        with self._recorded_lock:
+            start = self._recorded_count
+            end = start + len(rows)
+            if end > len(self._recorded):
+                self._recorded = np.resize(self._recorded,
+                                           max(end, 2 * len(self._recorded)))
             
+            # The first message of a frame carries its delta, the rest follow at 0
+            self._recorded[start:end] = rows
+            self._recorded['delta'][start] = delta_time
+            self._recorded_count = end
+    
+    def _sync_writer(self) -> bool:
+        """Wait until the writer thread has recorded every queued event, False on timeout"""
+        done = Event()
+        self._write_queue.put(done)
+        return done.wait(timeout=_WRITER_SYNC_TIMEOUT)
+    
+    def _append_recorded_messages(self):
+        """Drain the frames recorded since the last save into the track"""
+        with self._recorded_lock:
+            rows = self._recorded[:self._recorded_count].tolist()
+            self._recorded_count = 0
+        
+        # Repeated status bytes are left out (running status)
+        encoded = []
+        running_status = self._running_status
+        for status, a, b, delta_time in rows:
+            if status == running_status:
+                encoded.append(_encode_vlq(delta_time) + bytes((a, b)))
             else:
-                return  # Unknown event type
-            
-            self.track.append(msg)
-            self.last_event_time = current_time
-            
-        except Exception as e:
-            print(f"Error adding MIDI event: {e}")
+                encoded.append(_encode_vlq(delta_time) + bytes((status, a, b)))
+                running_status = status
+        
+        self._running_status = running_status
+        self.track_data += b"".join(encoded)
+    
+    def _ensure_path(self):
+        """Create the temporary output directory on first use"""
+        if self.temp_dir is None:
+            self.temp_dir = tempfile.mkdtemp()
+            self.midi_file_path = os.path.join(self.temp_dir, "motion_music.mid")
     
-    def save_midi_file(self):
-        """Save the current MIDI data to file"""
+    def save_midi_file(self) -> bool:
+        """Save the current MIDI data to file, returning whether it was saved"""
+        self._ensure_path()
         try:
-            self.midi_file.save(self.midi_file_path)
-            print(f"MIDI file saved: {self.midi_file_path}")
+            if not self._sync_writer():
+                logger.error("MIDI writer did not respond within %.1f s, file not saved",
+                             _WRITER_SYNC_TIMEOUT)
+                return False
+            self._append_recorded_messages()
+            
+            # Write the standard MIDI file directly from the encoded track
+            track_length = len(self.track_data) + len(_END_OF_TRACK)
+            with open(self.midi_file_path, 'wb') as f:
+                f.write(_SMF_HEADER)
+                f.write(struct.pack('>4sI', b'MTrk', track_length))
+                f.write(self.track_data)
+                f.write(_END_OF_TRACK)
+            logger.info("MIDI file saved: %s", self.midi_file_path)
+            return True
         except Exception as e:
-            print(f"Error saving MIDI file: {e}")
+            logger.warning("Error saving MIDI file: %s", e)
+            return False
     
     def get_currently_playing_notes(self) -> set:
         """Get set of currently playing notes"""
-        with self.note_lock:
-            return self.current_notes.copy()
+        return set(_mask_notes(self._published_mask))
     
     def clear_all_notes(self):
         """Clear all note tracking"""
-        with self.note_lock:
-            self.current_notes.clear()
+        # Applied by the gesture thread at the start of its next frame
+        self._clear_pending = True
+        self._published_mask = 0
     
     def get_midi_file_path(self) -> str:
         """Get path to the generated MIDI file"""
+        self._ensure_path()
         return self.midi_file_path
     
     def create_chord(self, root_note: int, chord_type: str = 'major') -> List[Dict]:
         """Create a chord based on root note and type"""
-        chord_intervals = {
-            'major': [0, 4, 7],
-            'minor': [0, 3, 7],
-            'seventh': [0, 4, 7, 10],
-            'diminished': [0, 3, 6]
-        }
-        
-        intervals = chord_intervals.get(chord_type, [0, 4, 7])
-        chord_events = []
-        
-        for interval in intervals:
-            note_number = root_note + interval
-            if 0 <= note_number <= 127:
-                chord_events.append({
-                    'type': 'note_on',
-                    'note': note_number,
-                    'velocity': self.default_velocity,
-                    'channel': self.default_channel,
-                    'timestamp': time.time()
-                })
-        
-        return chord_events
+        timestamp = time.monotonic()
+        
+        return [{
+            'type': 'note_on',
+            'note': note_number,
+            'velocity': self.default_velocity,
+            'channel': self.default_channel,
+            'timestamp': timestamp
+        } for note_number in _chord_notes(root_note, chord_type)]